@@ -1,38 +1,294 @@
 import subprocess
 import os
 import json
+import re
 import sys
+import time
+import atexit
+import argparse
+import base64
+import secrets
+import functools
+import itertools
+import tempfile
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def run_rclone_command(command, show_output=False):
+# prompt_toolkit is optional; without it folders are picked by number
+try:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.completion import Completer, Completion
+except ImportError:
+    PromptSession = None
+    Completer = object
+
+# questionary is optional; without it each choice is asked with input()
+try:
+    import questionary
+except ImportError:
+    questionary = None
+
+# tqdm is optional; without it transfer progress is printed as a plain line
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+# psutil is optional; without it available memory is read from sysconf where possible
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Default parallelism for rclone transfers; OneDrive is bound by API round-trips
+# rather than bandwidth, so more concurrent transfers/checkers help a lot.
+DEFAULT_TRANSFERS = 16
+MAX_CHECKERS = 32
+
+def _int_from_env(name, default, minimum=1):
+    """Read an integer setting of at least minimum from the environment, falling back to the default"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+        if number >= minimum:
+            return number
+    except ValueError:
+        pass
+    print(f"Warning: ignoring invalid {name}={value!r}, using {default} instead.")
+    return default
+
+@functools.lru_cache(maxsize=None)
+def get_parallelism():
+    """Get the number of rclone transfers and checkers to use"""
+    n_transfers = _int_from_env("ONEDRIVE_TRANSFERS", DEFAULT_TRANSFERS)
+    n_checkers = _int_from_env("ONEDRIVE_CHECKERS", min(MAX_CHECKERS, (os.cpu_count() or 4) * 4))
+    return n_transfers, n_checkers
+
+# Larger upload chunks and read buffers for machines with plenty of free memory.
+# Each transfer holds one chunk and one buffer in memory, so with the default
+# 16 transfers this needs about 16 x (100M + 64M) = ~2.6 GiB.
+HIGH_RAM_CHUNK_MB = 100
+HIGH_RAM_BUFFER_MB = 64
+HIGH_RAM_FLAGS = [f"--onedrive-chunk-size={HIGH_RAM_CHUNK_MB}M", f"--buffer-size={HIGH_RAM_BUFFER_MB}M"]
+
+def high_ram_memory_needed(n_transfers):
+    """Get the memory in bytes the high-RAM settings need for the given number of transfers"""
+    return n_transfers * (HIGH_RAM_CHUNK_MB + HIGH_RAM_BUFFER_MB) << 20
+
+def get_available_memory():
+    """Get available memory in bytes, or None if it can't be determined"""
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+# Top-level folder listings are cached on disk so repeated runs don't re-list the remote
+CACHE_DIR = Path.home() / ".cache" / "onedrive2onedrive"
+CACHE_TTL = _int_from_env("ONEDRIVE_CACHE_TTL", 3600, minimum=0)  # seconds; 0 disables the cache
+
+# Number of folders shown at a time in the numbered folder picker
+FOLDER_PAGE_SIZE = 50
+
+# Operation types offered to the user, with their menu descriptions
+OPERATIONS = [
+    ("copy", "Copy (add all files to destination)"),
+    ("sync", "Sync (make destination match source exactly)"),
+    ("migrate", "Migrate (only copy files that are missing or changed in destination)"),
+    ("bisync", "Incremental sync (bisync, keep both sides in sync across runs)"),
+]
+
+# Retries with exponential backoff when OneDrive throttles a transfer
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 30  # seconds
+# Matched against the message of error-level log lines only, never the file path
+THROTTLE_PATTERN = re.compile(r"\b429\b|Too Many Requests|activityLimitReached")
+
+# Errors Graph returns when a server-side copy between two accounts isn't allowed
+SERVER_SIDE_PATTERN = re.compile(r"itemNotFound|accessDenied|server[- ]side copy|can't copy", re.IGNORECASE)
+
+# Long-lived rclone daemon used for quick metadata calls such as listings,
+# so each interactive action doesn't pay rclone's startup cost again
+RC_ADDR = "127.0.0.1:5572"
+_rc_process = None
+_rc_auth = None
+
+def start_rc_daemon():
+    """Start the rclone remote control daemon and wait until it answers"""
+    global _rc_process, _rc_auth
+    # The daemon can delete files and dump OAuth tokens, so protect it with
+    # credentials that only this run knows
+    user, password = secrets.token_hex(8), secrets.token_urlsafe(24)
+    _rc_auth = "Basic " + base64.b64encode(f"{user}:{password}".encode('utf-8')).decode('ascii')
+    try:
+        _rc_process = subprocess.Popen(
+            ["./rclone", "rcd", f"--rc-addr={RC_ADDR}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            # Passed through the environment so they don't show up in the process list
+            env=dict(os.environ, RCLONE_RC_USER=user, RCLONE_RC_PASS=password)
+        )
+    except OSError:
+        return False
+    atexit.register(stop_rc_daemon)
+    
+    for _ in range(50):
+        if _rc_process.poll() is not None:
+            break
+        # Make sure the answer comes from our daemon and not another one
+        # already listening on the same port
+        result = rc_call("core/pid", quiet=True)
+        if result is not None:
+            if result.get("pid") == _rc_process.pid:
+                return True
+            break
+        time.sleep(0.1)
+    
+    # Daemon didn't come up; fall back to running rclone per command
+    stop_rc_daemon()
+    return False
+
+def stop_rc_daemon():
+    """Shut down the rclone daemon if it is running"""
+    global _rc_process
+    if _rc_process is None:
+        return
+    if _rc_process.poll() is None:
+        _rc_process.terminate()
+        try:
+            _rc_process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            _rc_process.kill()
+    _rc_process = None
+
+def rc_available():
+    """Check whether the rclone daemon is running"""
+    return _rc_process is not None and _rc_process.poll() is None
+
+def rc_call(method, params=None, quiet=False):
+    """Call a method on the rclone daemon and return the decoded JSON result"""
+    request = urllib.request.Request(
+        f"http://{RC_ADDR}/{method}",
+        data=json.dumps(params or {}).encode('utf-8'),
+        headers={"Content-Type": "application/json", "Authorization": _rc_auth or ""}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        if not quiet:
+            print(f"Error running rclone command: {method}")
+            print(f"Error output: {e.read().decode('utf-8', 'replace')}")
+        return None
+    except (urllib.error.URLError, OSError):
+        return None
+
+def run_rclone_command(command):
     """Run rclone command and return output"""
     try:
-        if show_output:
-            # Run with output shown in real-time
-            result = subprocess.run(command, check=True, text=True)
-            return None
-        else:
-            # Run with captured output
-            result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True)
-            return result.stdout
+        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', check=True)
+        return result.stdout
     except subprocess.CalledProcessError as e:
         print(f"Error running rclone command: {e}")
         print(f"Error output: {e.stderr}")
         return None
 
+def stream_rclone_command(command):
+    """Run rclone command and yield its output line by line as it arrives"""
+    # Line-buffered so each line is available as soon as rclone writes it,
+    # without holding the whole output in memory. stderr goes to a temporary
+    # file so a chatty rclone can't fill a pipe nobody is reading and hang
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file,
+                              text=True, encoding='utf-8', bufsize=1) as proc:
+            for line in proc.stdout:
+                yield line.rstrip('\n')
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode('utf-8', 'replace')
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command, stderr=stderr)
+
+def _format_bytes(size):
+    """Format a byte count for display"""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if size < 1024 or unit == "TiB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+def run_transfer_command(command):
+    """Run a transfer with rclone JSON logging; return (success, problems)"""
+    # rclone writes one JSON object per log line on stderr: stats lines drive
+    # the progress bar, warnings and errors are shown and handed back as
+    # dicts with the level, object and msg kept apart
+    problems = []
+    bar = tqdm(unit="B", unit_scale=True, unit_divisor=1024) if tqdm else None
+    write = bar.write if bar else print
+    # Without a bar, start a new line so messages don't overwrite the progress line
+    prefix = "" if bar else "\n"
+    with subprocess.Popen(command, stderr=subprocess.PIPE, text=True, encoding='utf-8', bufsize=1) as proc:
+        for line in proc.stderr:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                write(line.rstrip('\n'))
+                continue
+            
+            stats = entry.get("stats")
+            if stats:
+                done, total = stats.get("bytes", 0), stats.get("totalBytes", 0)
+                if bar:
+                    bar.total = total
+                    bar.n = done
+                    bar.refresh()
+                else:
+                    print(f"\rTransferred: {_format_bytes(done)} / {_format_bytes(total)}", end="", flush=True)
+            elif entry.get("level") in ("error", "critical", "warning", "notice"):
+                problem = {"level": entry["level"], "object": entry.get("object", ""), "msg": entry.get("msg", "")}
+                problems.append(problem)
+                message = f"{problem['object']}: {problem['msg']}" if problem["object"] else problem["msg"]
+                write(f"{prefix}{problem['level'].upper()}: {message}")
+    if bar:
+        bar.close()
+    else:
+        print()
+    return proc.returncode == 0, problems
+
+def _errors(problems):
+    """Get the messages of the error-level problems of a transfer"""
+    return [p["msg"] for p in problems if p["level"] in ("error", "critical")]
+
+def is_throttled(problems):
+    """Check whether a transfer failed because OneDrive throttled it"""
+    return any(THROTTLE_PATTERN.search(msg) for msg in _errors(problems))
+
+def retry_decision(problems, attempt, server_side):
+    """Decide how to retry a failed transfer: "throttled", "local" or None"""
+    if is_throttled(problems):
+        return "throttled" if attempt < MAX_RETRIES else None
+    # Only repeat the whole transfer through this machine when the server-side
+    # copy itself was refused, not for ordinary per-file failures
+    if server_side and any(SERVER_SIDE_PATTERN.search(msg) for msg in _errors(problems)):
+        return "local"
+    return None
+
 def get_existing_remotes():
-    """Get list of existing rclone remote configurations"""
-    output = run_rclone_command(["./rclone", "listremotes"])
-    if not output:
-        return []
-    return [remote.strip(':') for remote in output.split('\n') if remote.strip()]
+    """Get list of existing OneDrive remote configurations, or None if rclone failed"""
+    # A single config dump both proves rclone runs and lists the remotes;
+    # raises FileNotFoundError if the rclone binary is missing
+    output = run_rclone_command(["./rclone", "config", "dump"])
+    if output is None:
+        return None
+    config = json.loads(output or "{}")
+    return [name for name, options in config.items() if options.get("type") == "onedrive"]
 
-def configure_rclone():
+def configure_rclone(existing_remotes):
     """Configure rclone for both source and destination OneDrive accounts"""
     print("Let's configure rclone for your OneDrive accounts.")
     
-    # Get existing remotes
-    existing_remotes = get_existing_remotes()
     if existing_remotes:
         print("\nFound existing rclone configurations:")
         for i, remote in enumerate(existing_remotes, 1):
@@ -90,68 +346,374 @@ def configure_rclone():
     
     return source_name, dest_name
 
+def list_remote(remote, path="", recursive=True, files_only=False, dirs_only=False, hashes=False):
+    """List a path in a remote, optionally with hashes, or return None on error"""
+    # Hashes cost extra work on the remote, so only ask for them when they are compared
+    show_hash = hashes and not dirs_only
+    # Paths come back relative to the fs, so point the fs at the folder itself
+    # to get folder-relative paths like lsjson does
+    if rc_available():
+        result = rc_call("operations/list", {
+            "fs": f"{remote}:{path}",
+            "remote": "",
+            "opt": {"recurse": recursive, "showHash": show_hash, "noModTime": True,
+                    "filesOnly": files_only, "dirsOnly": dirs_only}
+        })
+        if result is None:
+            return None
+        return result["list"]
+    
+    command = ["./rclone", "lsjson", "--no-modtime", f"{remote}:{path}"]
+    if show_hash:
+        command.append("--hash")
+    if recursive:
+        command.append("--recursive")
+    if files_only:
+        command.append("--files-only")
+    if dirs_only:
+        command.append("--dirs-only")
+    
+    # lsjson prints one entry per line, so parse entries as they stream in
+    listing = []
+    try:
+        for line in stream_rclone_command(command):
+            line = line.strip().rstrip(',')
+            if line and line not in ('[', ']'):
+                listing.append(json.loads(line))
+    except subprocess.CalledProcessError as e:
+        print(f"Error running rclone command: {e}")
+        print(f"Error output: {e.stderr}")
+        return None
+    return listing
+
+def _cached_listing(remote):
+    """Get the top-level folders of a remote, using the on-disk cache if it is fresh"""
+    cache_file = CACHE_DIR / f"{remote}.json"
+    try:
+        if time.time() - cache_file.stat().st_mtime < CACHE_TTL:
+            with open(cache_file, encoding='utf-8') as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    
+    # Only the root is needed for the folder picker, so don't walk the whole drive
+    listing = list_remote(remote, recursive=False, dirs_only=True)
+    if listing is None:
+        return None
+    
+    # Write atomically so an interrupted run never leaves a truncated cache behind
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".json.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(listing, f)
+    os.replace(tmp_file, cache_file)
+    return listing
+
+@functools.lru_cache(maxsize=16)
+def _fetch_listing(remote):
+    """Get the listing of a remote, reusing it for the rest of the session"""
+    return _cached_listing(remote)
+
+def refresh_listing(remote):
+    """Drop cached listings so the remote is listed again on next use"""
+    _fetch_listing.cache_clear()
+    try:
+        (CACHE_DIR / f"{remote}.json").unlink()
+    except FileNotFoundError:
+        pass
+
 def list_folders(remote_name):
-    """List folders in the specified remote"""
+    """List folders in the specified remote as a lazy iterator"""
     print(f"\nListing folders in {remote_name}:")
-    output = run_rclone_command(["rclone", "lsf", f"{remote_name}:"])
+    listing = _fetch_listing(remote_name)
     
-    if not output:
+    if listing is None:
         print("No folders found or error occurred. Please check your authentication.")
-        return []
-    
-    folders = [line for line in output.split('\n') if line.strip()]
+        return iter(())
     
-    if not folders:
-        print("No folders found in the remote.")
-        return []
+    # Only offer top-level folders for selection
+    return (entry["Path"] for entry in listing if entry.get("IsDir") and "/" not in entry["Path"])
+
+class FolderCompleter(Completer):
+    """Complete folder names against the whole input, so names with spaces work"""
     
-    for i, folder in enumerate(folders, 1):
-        print(f"{i}. {folder}")
+    def __init__(self, folders):
+        self.folders = folders
     
-    return folders
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        needle = text.lower()
+        # Folders starting with the input come first, then those merely containing it
+        prefix_matches = [f for f in self.folders if f.lower().startswith(needle)]
+        other_matches = [f for f in self.folders if needle in f.lower() and not f.lower().startswith(needle)]
+        for folder in prefix_matches + other_matches:
+            yield Completion(folder, start_position=-len(text))
+
+def _retry_listing(remote_name):
+    """Ask whether to list the remote again after an empty listing, exit if not"""
+    retry = input("\nWould you like to try again? (yes/no): ")
+    if retry.lower() != 'yes':
+        sys.exit(1)
+    refresh_listing(remote_name)
 
 def select_folder(remote_name):
     """Let user select a folder from the remote"""
     while True:
         folders = list_folders(remote_name)
-        if not folders:
-            retry = input("\nWould you like to try again? (yes/no): ")
-            if retry.lower() != 'yes':
-                sys.exit(1)
+        
+        if PromptSession is not None:
+            # Match folder names locally as the user types instead of paging through a numbered list
+            folders = list(folders)
+            if not folders:
+                print("No folders found in the remote.")
+                _retry_listing(remote_name)
+                continue
+            print(f"Found {len(folders)} folders. Start typing a name and press Tab to complete it.")
+            folder_names = set(folders)
+            completer = FolderCompleter(folders)
+            session = PromptSession()
+            while True:
+                answer = session.prompt("folder> ", completer=completer).strip()
+                if answer.lower() == 'refresh':
+                    refresh_listing(remote_name)
+                    break
+                if answer in folder_names:
+                    return answer
+                print("Unknown folder. Please pick one of the suggestions or type 'refresh' to list again.")
             continue
-            
+        
+        # Show the folders a page at a time, keeping the pages already shown
+        # so earlier numbers stay valid
+        shown = []
+        # One folder read ahead of the current page, to know whether there are more
+        pending = []
+        
+        def show_next_page():
+            page = pending + list(itertools.islice(folders, FOLDER_PAGE_SIZE + 1 - len(pending)))
+            pending[:] = page[FOLDER_PAGE_SIZE:]
+            page = page[:FOLDER_PAGE_SIZE]
+            for i, folder in enumerate(page, len(shown) + 1):
+                print(f"{i}. {folder}")
+            shown.extend(page)
+            return bool(pending)
+        
+        more = show_next_page()
+        if not shown:
+            print("No folders found in the remote.")
+            _retry_listing(remote_name)
+            continue
+        
+        while True:
+            hint = "press Enter for more, " if more else ""
+            answer = input(f"\nEnter the number of the folder you want to select ({hint}or 'refresh' to list again): ").strip()
+            if answer.lower() == 'refresh':
+                refresh_listing(remote_name)
+                break
+            if not answer:
+                if more:
+                    more = show_next_page()
+                else:
+                    print("No more folders.")
+                continue
+            try:
+                choice = int(answer)
+                if 1 <= choice <= len(shown):
+                    return shown[choice - 1]
+                print("Invalid selection. Please try again.")
+            except ValueError:
+                print("Please enter a valid number.")
+
+def get_hash_types(remote):
+    """Get the hash types a remote supports, or None if they can't be determined"""
+    if rc_available():
+        info = rc_call("operations/fsinfo", {"fs": f"{remote}:"})
+    else:
+        output = run_rclone_command(["./rclone", "backend", "features", f"{remote}:"])
+        info = json.loads(output) if output else None
+    if info is None:
+        return None
+    return set(info.get("Hashes") or [])
+
+def get_common_hashes(source_remote, dest_remote):
+    """Get the hash types both remotes support, or None if they can't be determined"""
+    source_hashes = get_hash_types(source_remote)
+    dest_hashes = get_hash_types(dest_remote)
+    if source_hashes is None or dest_hashes is None:
+        return None
+    return source_hashes & dest_hashes
+
+def _hashes_differ(source_entry, dest_entry):
+    """Check whether two listing entries have a differing hash of the same type"""
+    source_hashes = source_entry.get("Hashes") or {}
+    dest_hashes = dest_entry.get("Hashes") or {}
+    return any(source_hashes[name] != dest_hashes[name] for name in source_hashes.keys() & dest_hashes.keys())
+
+def build_migration_plan(source_remote, source_folder, dest_remote, dest_folder, compare_hashes):
+    """Work out which source files are missing or different in the destination"""
+    # Returns paths relative to the source folder, or None if either side couldn't be listed
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fut_src = executor.submit(list_remote, source_remote, source_folder, files_only=True, hashes=compare_hashes)
+        fut_dst = executor.submit(list_remote, dest_remote, dest_folder, files_only=True, hashes=compare_hashes)
+        source_files, dest_files = fut_src.result(), fut_dst.result()
+    if source_files is None or dest_files is None:
+        return None
+    
+    dest_by_path = {entry["Path"]: entry for entry in dest_files}
+    missing = []
+    for entry in source_files:
+        other = dest_by_path.get(entry["Path"])
+        if (other is None or other.get("Size") != entry.get("Size")
+                or (compare_hashes and _hashes_differ(entry, other))):
+            missing.append(entry["Path"])
+    return missing
+
+def select_operation():
+    """Let user select the operation type"""
+    print("\nSelect operation type:")
+    for i, (_, description) in enumerate(OPERATIONS, 1):
+        print(f"{i}. {description}")
+    while True:
         try:
-            choice = int(input("\nEnter the number of the folder you want to select: "))
-            if 1 <= choice <= len(folders):
-                return folders[choice - 1]
-            print("Invalid selection. Please try again.")
+            op_choice = int(input(f"\nEnter your choice (1-{len(OPERATIONS)}): "))
+            if 1 <= op_choice <= len(OPERATIONS):
+                return OPERATIONS[op_choice - 1][0]
+            print(f"Invalid selection. Please enter a number from 1 to {len(OPERATIONS)}.")
         except ValueError:
             print("Please enter a valid number.")
 
-def transfer_files(source_remote, source_folder, dest_remote, dest_folder, operation_type):
+def ask_transfer_form(existing_remotes):
+    """Ask for source, destination and operation in one questionary form"""
+    # Returns None if the user cancelled the form
+    while True:
+        answers = questionary.form(
+            source=questionary.select("Source OneDrive account:", choices=existing_remotes),
+            dest=questionary.select("Destination OneDrive account:", choices=existing_remotes),
+            operation=questionary.select(
+                "Operation type:",
+                choices=[questionary.Choice(description, value=op) for op, description in OPERATIONS]
+            ),
+        ).ask()
+        if not answers:
+            return None
+        if answers["source"] != answers["dest"]:
+            return answers["source"], answers["dest"], answers["operation"]
+        print("Source and destination accounts must be different. Please try again.")
+
+def ask_yes_no(question, default=False):
+    """Ask a yes/no question"""
+    if questionary is not None:
+        return bool(questionary.confirm(question, default=default).ask())
+    hint = "(Y/n)" if default else "(y/N)"
+    answer = input(f"\n{question} {hint}: ").strip().lower()
+    if not answer:
+        return default
+    return answer in ('y', 'yes')
+
+def _marker_file(kind, source, dest):
+    """Get the marker file recording the last successful run between two paths"""
+    name = f"{kind}-{source}-{dest}".replace(":", "_").replace("/", "_")
+    return CACHE_DIR / f"{name}.done"
+
+def _touch_marker(marker, timestamp):
+    """Record a successful run that started at the given time"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    marker.touch()
+    os.utime(marker, (timestamp, timestamp))
+
+def transfer_files(source_remote, source_folder, dest_remote, dest_folder, operation_type, verify_checksum=False, high_ram=False):
     """Transfer files from source to destination using specified operation type"""
-    print(f"\nStarting {operation_type} from {source_remote}:{source_folder} to {dest_remote}:{dest_folder}")
-    
-    # Create destination folder if it doesn't exist
-    run_rclone_command(["./rclone", "mkdir", f"{dest_remote}:{dest_folder}"])
+    source = f"{source_remote}:{source_folder}"
+    dest = f"{dest_remote}:{dest_folder}"
+    print(f"\nStarting {operation_type} from {source} to {dest}")
+    started = time.time()
+    marker = None
+    files_from = None
     
     # Set up base command
     command = ["./rclone"]
     
     # Add operation-specific options
     if operation_type == "migrate":
-        command.extend(["copy", "--ignore-existing"])
+        command.append("copy")
+        compare_hashes = False
+        if verify_checksum:
+            # OneDrive Personal and Business can use different hashes; without a
+            # common one --checksum would quietly fall back to size and modtime
+            common_hashes = get_common_hashes(source_remote, dest_remote)
+            if common_hashes is not None and not common_hashes:
+                print("\nWARNING: These accounts share no hash type, so files can't be compared by checksum.")
+                print("Checking all files by size instead.")
+                command.extend(["--size-only", "--update"])
+            else:
+                # Compare server-side hashes; OneDrive exposes them so no file bytes are read
+                command.append("--checksum")
+                compare_hashes = True
+        else:
+            # Fast path: compare sizes only, and never overwrite newer destination files
+            command.extend(["--size-only", "--update"])
+            marker = _marker_file("migrate", source, dest)
+        
+        # List both sides up front and hand rclone only the files that need copying,
+        # so it spends no time checking files already in the destination
+        print("\nComparing source and destination...")
+        plan = build_migration_plan(source_remote, source_folder, dest_remote, dest_folder, compare_hashes)
+        if plan is not None:
+            if not plan:
+                if marker is not None:
+                    _touch_marker(marker, started)
+                print("\nNothing to migrate, the destination is already up to date.")
+                return
+            print(f"{len(plan)} files need to be copied.")
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+                f.write("\n".join(plan) + "\n")
+                files_from = f.name
+            command.extend(["--files-from-raw", files_from, "--no-traverse"])
+        elif marker is not None and marker.exists():
+            # Couldn't list both sides; only look at files changed since the last successful migration
+            since = int(started - marker.stat().st_mtime) + 1
+            command.append(f"--max-age={since}s")
+    elif operation_type == "bisync":
+        command.append("bisync")
+        # bisync needs one full --resync run before it can work incrementally
+        marker = _marker_file("bisync", source, dest)
+        if not marker.exists():
+            command.append("--resync")
     else:
         command.append(operation_type)  # "copy" or "sync"
     
     # Add source and destination
     command.extend([
-        f"{source_remote}:{source_folder}",
-        f"{dest_remote}:{dest_folder}",
-        "--progress",
-        "-v"  # Add verbose output
+        source,
+        dest,
+        # Structured logs with stats every second, parsed for progress and errors
+        "--use-json-log",
+        "--stats=1s",
+        "--stats-log-level=NOTICE",
+        # rclone creates the destination folder itself; this also keeps empty
+        # folders, so no separate mkdir call is needed
+        "--create-empty-src-dirs"
+    ])
+    
+    # Move many files concurrently and list the source in one recursive call
+    n_transfers, n_checkers = get_parallelism()
+    command.extend([
+        "--transfers", str(n_transfers),
+        "--checkers", str(n_checkers),
+        "--fast-list"
     ])
     
+    # Fewer, larger upload requests for big files when there is memory to spare
+    if high_ram:
+        available = get_available_memory()
+        needed = high_ram_memory_needed(n_transfers)
+        if available is None:
+            print("Couldn't determine free memory for --high-ram (installing psutil helps), using default chunk sizes.")
+        elif available < needed:
+            print(f"--high-ram needs {_format_bytes(needed)} free for {n_transfers} transfers "
+                  f"but only {_format_bytes(available)} is available, using default chunk sizes.")
+        else:
+            command.extend(HIGH_RAM_FLAGS)
+    
     # Add additional options for sync
     if operation_type == "sync":
         command.extend([
@@ -159,51 +721,111 @@ def transfer_files(source_remote, source_folder, dest_remote, dest_folder, opera
             "--delete-excluded"  # Delete excluded files from destination
         ])
     
+    # Let OneDrive copy between the two accounts in the cloud where the tenants
+    # allow it, so file contents don't pass through this machine
+    command.append("--server-side-across-configs")
+    
     print("\nTransfer in progress... You'll see the progress below:\n")
-    run_rclone_command(command, show_output=True)
+    try:
+        attempt = 0
+        while True:
+            success, problems = run_transfer_command(command)
+            if success:
+                break
+            # bisync keeps its own state between runs, so never repeat it without the flag
+            server_side = "--server-side-across-configs" in command and operation_type != "bisync"
+            decision = retry_decision(problems, attempt, server_side)
+            if decision == "throttled":
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                attempt += 1
+                print(f"\nOneDrive is throttling requests, retrying in {delay} seconds (attempt {attempt} of {MAX_RETRIES})...\n")
+                time.sleep(delay)
+                continue
+            if decision == "local":
+                print("\nServer-side copy isn't allowed between these accounts, copying through this machine instead.\n")
+                command.remove("--server-side-across-configs")
+                continue
+            break
+    finally:
+        if files_from is not None:
+            os.remove(files_from)
+    
+    if not success:
+        print(f"\n{operation_type.capitalize()} finished with errors. Please check the messages above.")
+        if operation_type == "bisync" and marker.exists():
+            # rclone needs --resync after a failed bisync, so forget the last good run
+            marker.unlink()
+            print("The next incremental sync between these folders will do a full resync.")
+        return
+    
+    if marker is not None:
+        _touch_marker(marker, started)
     
     print(f"\n{operation_type.capitalize()} completed!")
 
 def main():
+    parser = argparse.ArgumentParser(description="Transfer files between two OneDrive accounts using rclone.")
+    parser.add_argument("--high-ram", action="store_true",
+                        help="use 100M upload chunks and 64M buffers per transfer when enough memory "
+                             "is free for them (about 2.6 GiB with the default 16 transfers)")
+    args = parser.parse_args()
+    
     print("Welcome to the OneDrive Transfer Tool!")
     
-    # Check if rclone is installed
+    # Check the parallelism settings now rather than after all the prompts
+    get_parallelism()
+    
+    # Check if rclone is installed and read the existing remotes in one call
     try:
-        subprocess.run(["./rclone", "version"], capture_output=True, check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        existing_remotes = get_existing_remotes()
+    except FileNotFoundError:
+        existing_remotes = None
+    if existing_remotes is None:
         print("Error: rclone is not found in the current directory.")
         print("Please make sure rclone.exe is in the same directory as this script.")
         sys.exit(1)
     
-    # Configure rclone if needed
-    source_remote, dest_remote = configure_rclone()
+    # Start the rclone daemon for quick metadata calls
+    if not start_rc_daemon():
+        print("Note: rclone daemon could not be started, running rclone per command instead.")
     
-    # Select source folder
-    print("\nSelect source folder:")
-    source_folder = select_folder(source_remote)
+    # Collect accounts and operation in one form when questionary is available
+    operation_type = None
+    use_form = questionary is not None and len(existing_remotes) >= 2
+    if use_form:
+        print(f"\nFound existing rclone configurations: {', '.join(existing_remotes)}")
+        if not ask_yes_no("Use existing configurations? (No configures new accounts)", default=True):
+            use_form = False
+            # Go straight to configuring new accounts
+            existing_remotes = []
+    if use_form:
+        answers = ask_transfer_form(existing_remotes)
+        if answers is None:
+            print("Operation cancelled.")
+            return
+        source_remote, dest_remote, operation_type = answers
+    else:
+        # Configure rclone if needed
+        source_remote, dest_remote = configure_rclone(existing_remotes)
     
-    # Select destination folder
-    print("\nSelect destination folder:")
-    dest_folder = select_folder(dest_remote)
+    # Fetch both listings at once so the destination is ready while the source is browsed
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fut_src = executor.submit(_fetch_listing, source_remote)
+        fut_dst = executor.submit(_fetch_listing, dest_remote) if dest_remote != source_remote else fut_src
+        
+        # Select source folder
+        fut_src.result()
+        print("\nSelect source folder:")
+        source_folder = select_folder(source_remote)
+        
+        # Select destination folder
+        fut_dst.result()
+        print("\nSelect destination folder:")
+        dest_folder = select_folder(dest_remote)
     
     # Select operation type
-    print("\nSelect operation type:")
-    print("1. Copy (add all files to destination)")
-    print("2. Sync (make destination match source exactly)")
-    print("3. Migrate (only copy files that don't exist in destination)")
-    while True:
-        try:
-            op_choice = int(input("\nEnter your choice (1, 2, or 3): "))
-            if op_choice in [1, 2, 3]:
-                operation_type = {
-                    1: "copy",
-                    2: "sync",
-                    3: "migrate"
-                }[op_choice]
-                break
-            print("Invalid selection. Please enter 1, 2, or 3.")
-        except ValueError:
-            print("Please enter a valid number.")
+    if operation_type is None:
+        operation_type = select_operation()
     
     # Confirm transfer
     print(f"\nYou are about to {operation_type} files from:")
@@ -213,13 +835,20 @@ def main():
     if operation_type == "sync":
         print("\nWARNING: Sync will delete files in the destination that don't exist in the source!")
     elif operation_type == "migrate":
-        print("\nMigration will only copy files that don't exist in the destination.")
-        print("Existing files will be skipped.")
+        print("\nMigration will only copy files that are missing or changed in the destination.")
+        print("Existing files with the same size will be skipped.")
+        print("Both sides are listed first, and only the missing or changed files are handed to rclone.")
+    elif operation_type == "bisync":
+        print("\nWARNING: Bisync propagates changes and deletions in both directions!")
+        print("The first run does a full resync; later runs only handle changed files.")
     
-    confirm = input("\nDo you want to proceed? (yes/no): ")
+    verify_checksum = False
+    if operation_type == "migrate":
+        verify_checksum = ask_yes_no("Verify with checksum?")
     
-    if confirm.lower() == 'yes':
-        transfer_files(source_remote, source_folder, dest_remote, dest_folder, operation_type)
+    if ask_yes_no("Do you want to proceed?"):
+        transfer_files(source_remote, source_folder, dest_remote, dest_folder, operation_type, verify_checksum,
+                       high_ram=args.high_ram)
     else:
         print("Operation cancelled.")
 
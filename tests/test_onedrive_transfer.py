@@ -0,0 +1,312 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import onedrive_transfer
+
+# Files in each fake remote, as paths from the remote root
+TREE = {
+    "src": {"Docs/a.txt": 1, "Docs/b/c.txt": 2, "Other/x.txt": 3},
+    "dst": {"Backup/a.txt": 1},
+}
+
+def _entries(remote, root):
+    """Yield lsjson-style entries below root, with paths relative to root"""
+    prefix = f"{root}/" if root else ""
+    for path, size in TREE[remote].items():
+        if path.startswith(prefix):
+            yield {"Path": path[len(prefix):], "Name": path.rsplit("/", 1)[-1], "Size": size, "IsDir": False}
+
+def fake_rc_call(method, params=None, quiet=False):
+    """Answer operations/list like rclone does: paths are relative to the fs root"""
+    remote, root = params["fs"].split(":", 1)
+    listed = "/".join(part for part in (root, params["remote"]) if part)
+    entries = []
+    for entry in _entries(remote, listed):
+        entry["Path"] = "/".join(part for part in (params["remote"], entry["Path"]) if part)
+        entries.append(entry)
+    return {"list": entries}
+
+def fake_stream_rclone_command(command):
+    """Print lsjson output for the remote:path given as the command's listed path"""
+    target = next(arg for arg in command if ":" in arg)
+    remote, root = target.split(":", 1)
+    entries = list(_entries(remote, root))
+    yield "["
+    for i, entry in enumerate(entries):
+        yield json.dumps(entry) + ("," if i < len(entries) - 1 else "")
+    yield "]"
+
+def _problem(msg, level="error", obj=""):
+    """Build a problem as returned by run_transfer_command"""
+    return {"level": level, "object": obj, "msg": msg}
+
+class ListRemoteTest(unittest.TestCase):
+    def run_with_rc(self, func, *args):
+        with mock.patch.object(onedrive_transfer, "rc_available", return_value=True), \
+                mock.patch.object(onedrive_transfer, "rc_call", side_effect=fake_rc_call):
+            return func(*args)
+
+    def run_with_cli(self, func, *args):
+        with mock.patch.object(onedrive_transfer, "rc_available", return_value=False), \
+                mock.patch.object(onedrive_transfer, "stream_rclone_command", side_effect=fake_stream_rclone_command):
+            return func(*args)
+
+    def test_paths_are_relative_to_folder(self):
+        expected = {"a.txt", "b/c.txt"}
+        for run in (self.run_with_rc, self.run_with_cli):
+            with self.subTest(run=run.__name__):
+                listing = run(onedrive_transfer.list_remote, "src", "Docs")
+                self.assertEqual({entry["Path"] for entry in listing}, expected)
+
+    def test_migration_plan_lists_only_missing_files(self):
+        for run in (self.run_with_rc, self.run_with_cli):
+            with self.subTest(run=run.__name__):
+                plan = run(onedrive_transfer.build_migration_plan, "src", "Docs", "dst", "Backup", False)
+                self.assertEqual(plan, ["b/c.txt"])
+
+    def test_migration_plan_asks_for_hashes_only_when_compared(self):
+        for compare_hashes in (False, True):
+            with self.subTest(compare_hashes=compare_hashes):
+                with mock.patch.object(onedrive_transfer, "rc_available", return_value=True), \
+                        mock.patch.object(onedrive_transfer, "rc_call", side_effect=fake_rc_call) as rc_call:
+                    onedrive_transfer.build_migration_plan("src", "Docs", "dst", "Backup", compare_hashes)
+                self.assertEqual({c.args[1]["opt"]["showHash"] for c in rc_call.call_args_list}, {compare_hashes})
+
+                commands = []
+
+                def record(command):
+                    commands.append(command)
+                    return fake_stream_rclone_command(command)
+
+                with mock.patch.object(onedrive_transfer, "rc_available", return_value=False), \
+                        mock.patch.object(onedrive_transfer, "stream_rclone_command", side_effect=record):
+                    onedrive_transfer.build_migration_plan("src", "Docs", "dst", "Backup", compare_hashes)
+                self.assertEqual({"--hash" in command for command in commands}, {compare_hashes})
+
+class TransferFilesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patches = [
+            mock.patch.object(onedrive_transfer, "CACHE_DIR", Path(tmp.name)),
+            mock.patch.object(onedrive_transfer, "rc_available", return_value=False),
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.commands = []
+
+    def transfer(self, operation_type, results, **kwargs):
+        """Run transfer_files with rclone runs returning the given (success, problems) results"""
+        results = iter(results)
+
+        def fake_run(command):
+            self.commands.append(list(command))
+            return next(results)
+
+        with mock.patch.object(onedrive_transfer, "run_transfer_command", side_effect=fake_run):
+            onedrive_transfer.transfer_files("src", "Docs", "dst", "Backup", operation_type, **kwargs)
+
+    def test_failed_bisync_forces_resync_next_time(self):
+        self.transfer("bisync", [(True, [])])
+        self.assertIn("--resync", self.commands[-1])
+        self.transfer("bisync", [(False, [_problem("Bisync aborted")])])
+        self.assertNotIn("--resync", self.commands[-1])
+        self.transfer("bisync", [(True, [])])
+        self.assertIn("--resync", self.commands[-1])
+
+    def migrate(self, plan):
+        """Run a size-only migrate with build_migration_plan returning the given plan"""
+        self.files_from = []
+
+        def fake_run(command):
+            # Read the plan file while it still exists
+            if "--files-from-raw" in command:
+                path = command[command.index("--files-from-raw") + 1]
+                with open(path, encoding="utf-8") as f:
+                    self.files_from.append((path, f.read()))
+            return (True, [])
+
+        with mock.patch.object(onedrive_transfer, "build_migration_plan", return_value=plan), \
+                mock.patch.object(onedrive_transfer, "run_transfer_command", side_effect=fake_run) as run:
+            onedrive_transfer.transfer_files("src", "Docs", "dst", "Backup", "migrate")
+        self.commands.extend(c.args[0] for c in run.call_args_list)
+
+    def marker(self):
+        return onedrive_transfer._marker_file("migrate", "src:Docs", "dst:Backup")
+
+    def test_migrate_copies_only_planned_files(self):
+        self.migrate(["b/c.txt", "#notes.txt"])
+        command = self.commands[-1]
+        self.assertEqual(command[:2], ["./rclone", "copy"])
+        self.assertIn("--no-traverse", command)
+        self.assertIn("--size-only", command)
+        self.assertFalse(any(arg.startswith("--max-age") for arg in command))
+        path, contents = self.files_from[-1]
+        self.assertEqual(contents, "b/c.txt\n#notes.txt\n")
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(self.marker().exists())
+
+    def test_migrate_with_empty_plan_runs_nothing(self):
+        self.migrate([])
+        self.assertEqual(self.commands, [])
+        self.assertTrue(self.marker().exists())
+
+    def test_migrate_without_plan_falls_back_to_max_age(self):
+        self.migrate(None)
+        self.assertFalse(any(arg.startswith("--max-age") for arg in self.commands[-1]))
+        self.migrate(None)
+        command = self.commands[-1]
+        self.assertNotIn("--files-from-raw", command)
+        self.assertTrue(any(arg.startswith("--max-age=") for arg in command))
+
+    def test_high_ram_needs_memory_for_every_transfer(self):
+        flag = onedrive_transfer.HIGH_RAM_FLAGS[0]
+        cases = [
+            (16, 4 << 30, True),
+            (64, 4 << 30, False),
+            (16, None, False),
+        ]
+        for n_transfers, available, used in cases:
+            with self.subTest(n_transfers=n_transfers, available=available), \
+                    mock.patch.object(onedrive_transfer, "get_parallelism", return_value=(n_transfers, 8)), \
+                    mock.patch.object(onedrive_transfer, "get_available_memory", return_value=available):
+                self.transfer("copy", [(True, [])], high_ram=True)
+                self.assertEqual(flag in self.commands[-1], used)
+
+class StreamRcloneCommandTest(unittest.TestCase):
+    def test_large_stderr_does_not_block(self):
+        script = "import sys; sys.stderr.write('x' * 200000); sys.stderr.flush(); print('done')"
+        lines = list(onedrive_transfer.stream_rclone_command([sys.executable, "-c", script]))
+        self.assertEqual(lines, ["done"])
+
+    def test_failure_raises_with_stderr(self):
+        script = "import sys; sys.stderr.write('boom'); sys.exit(3)"
+        with self.assertRaises(onedrive_transfer.subprocess.CalledProcessError) as ctx:
+            list(onedrive_transfer.stream_rclone_command([sys.executable, "-c", script]))
+        self.assertEqual(ctx.exception.stderr, "boom")
+
+@unittest.skipIf(onedrive_transfer.PromptSession is None, "prompt_toolkit is not installed")
+class FolderCompleterTest(unittest.TestCase):
+    def test_completion_replaces_whole_input(self):
+        from prompt_toolkit.document import Document
+        completer = onedrive_transfer.FolderCompleter(["Music", "My Documents", "Old My Data"])
+        completions = list(completer.get_completions(Document("My D"), None))
+        self.assertEqual([c.text for c in completions], ["My Documents", "Old My Data"])
+        self.assertTrue(all(c.start_position == -len("My D") for c in completions))
+
+class NumberedFolderPickerTest(unittest.TestCase):
+    def pick(self, count, answers):
+        prompts = []
+        answers = iter(answers)
+
+        def fake_input(prompt):
+            prompts.append(prompt)
+            return next(answers)
+
+        folders = [f"folder{i}" for i in range(1, count + 1)]
+        with mock.patch.object(onedrive_transfer, "PromptSession", None), \
+                mock.patch.object(onedrive_transfer, "list_folders", return_value=iter(folders)), \
+                mock.patch("builtins.input", side_effect=fake_input), \
+                mock.patch("builtins.print"):
+            return onedrive_transfer.select_folder("src"), prompts
+
+    def test_full_last_page_offers_no_more(self):
+        choice, prompts = self.pick(onedrive_transfer.FOLDER_PAGE_SIZE, ["3"])
+        self.assertEqual(choice, "folder3")
+        self.assertNotIn("Enter for more", prompts[0])
+
+    def test_next_page_keeps_numbers(self):
+        size = onedrive_transfer.FOLDER_PAGE_SIZE
+        choice, prompts = self.pick(size + 1, ["", str(size + 1)])
+        self.assertEqual(choice, f"folder{size + 1}")
+        self.assertIn("Enter for more", prompts[0])
+        self.assertNotIn("Enter for more", prompts[1])
+
+class ParallelismTest(unittest.TestCase):
+    def setUp(self):
+        onedrive_transfer.get_parallelism.cache_clear()
+        self.addCleanup(onedrive_transfer.get_parallelism.cache_clear)
+
+    def test_invalid_values_fall_back_to_defaults(self):
+        env = {"ONEDRIVE_TRANSFERS": "lots", "ONEDRIVE_CHECKERS": "0"}
+        with mock.patch.dict(os.environ, env), mock.patch("builtins.print"):
+            n_transfers, n_checkers = onedrive_transfer.get_parallelism()
+        self.assertEqual(n_transfers, onedrive_transfer.DEFAULT_TRANSFERS)
+        self.assertGreater(n_checkers, 0)
+
+    def test_valid_values_are_used(self):
+        env = {"ONEDRIVE_TRANSFERS": "8", "ONEDRIVE_CHECKERS": "12"}
+        with mock.patch.dict(os.environ, env):
+            self.assertEqual(onedrive_transfer.get_parallelism(), (8, 12))
+
+    def test_cache_ttl_accepts_zero_and_rejects_units(self):
+        with mock.patch.dict(os.environ, {"ONEDRIVE_CACHE_TTL": "0"}):
+            self.assertEqual(onedrive_transfer._int_from_env("ONEDRIVE_CACHE_TTL", 3600, minimum=0), 0)
+        with mock.patch.dict(os.environ, {"ONEDRIVE_CACHE_TTL": "1h"}), mock.patch("builtins.print"):
+            self.assertEqual(onedrive_transfer._int_from_env("ONEDRIVE_CACHE_TTL", 3600, minimum=0), 3600)
+
+class RunTransferCommandTest(unittest.TestCase):
+    def test_parses_problems_and_skips_stats(self):
+        lines = [
+            {"level": "notice", "msg": "Transferred: 1 MiB", "stats": {"bytes": 1, "totalBytes": 2}},
+            {"level": "info", "msg": "Copied (new)", "object": "a.txt"},
+            {"level": "error", "msg": "Failed to copy: quota exceeded", "object": "Photos/IMG_4291.jpg"},
+            {"level": "warning", "msg": "Time may be set wrong"},
+        ]
+        script = ("import sys, json\n"
+                  f"for entry in {lines!r}:\n"
+                  "    sys.stderr.write(json.dumps(entry) + '\\n')\n"
+                  "sys.stderr.write('not json\\n')\n"
+                  "sys.exit(1)\n")
+        with mock.patch.object(onedrive_transfer, "tqdm", None), mock.patch("builtins.print"):
+            success, problems = onedrive_transfer.run_transfer_command([sys.executable, "-c", script])
+        self.assertFalse(success)
+        self.assertEqual(problems, [
+            _problem("Failed to copy: quota exceeded", obj="Photos/IMG_4291.jpg"),
+            _problem("Time may be set wrong", level="warning"),
+        ])
+
+class RetryDecisionTest(unittest.TestCase):
+    def test_throttle_errors_are_retried(self):
+        for msg in ("HTTP error 429", "429 Too Many Requests", "activityLimitReached: slow down"):
+            with self.subTest(msg=msg):
+                self.assertEqual(onedrive_transfer.retry_decision([_problem(msg)], 0, False), "throttled")
+
+    def test_file_names_and_warnings_are_not_throttling(self):
+        problems = [
+            _problem("Failed to copy: quota exceeded", obj="Photos/IMG_4291.jpg"),
+            _problem("Failed to copy: IMG_429.jpg too large"),
+            _problem("429 Too Many Requests", level="warning"),
+            _problem("Failed to copy", obj="throttling/notes.txt"),
+        ]
+        self.assertFalse(onedrive_transfer.is_throttled(problems))
+        self.assertIsNone(onedrive_transfer.retry_decision(problems, 0, False))
+
+    def test_throttle_retries_run_out(self):
+        problems = [_problem("429 Too Many Requests")]
+        self.assertIsNone(onedrive_transfer.retry_decision(problems, onedrive_transfer.MAX_RETRIES, False))
+
+    def test_refused_server_side_copy_falls_back(self):
+        problems = [_problem("Failed to copy: itemNotFound: The resource could not be found", obj="a.txt")]
+        self.assertEqual(onedrive_transfer.retry_decision(problems, 0, True), "local")
+        self.assertIsNone(onedrive_transfer.retry_decision(problems, 0, False))
+
+    def test_other_failures_do_not_fall_back(self):
+        problems = [_problem("Failed to copy: quota exceeded", obj="a.txt")]
+        self.assertIsNone(onedrive_transfer.retry_decision(problems, 0, True))
+
+    def test_no_fallback_after_throttle_retries_run_out(self):
+        problems = [_problem("429 Too Many Requests"), _problem("Failed to copy: accessDenied")]
+        self.assertIsNone(onedrive_transfer.retry_decision(problems, onedrive_transfer.MAX_RETRIES, True))
+
+if __name__ == "__main__":
+    unittest.main()